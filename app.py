@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import hashlib
+import requests
+from io import BytesIO
 
 # ---------------------------------------------------------
 # 1. 網頁設定
@@ -26,36 +30,125 @@ st.info(
 
 st.markdown("資料來源：**國防部即時軍事動態** | 資料更新：**GitHub Actions 自動化串接**")
 
+# 超過此筆數時折線圖改用 WebGL (Scattergl) 繪製
+SCATTERGL_MIN_ROWS = 1000
+
+# 超過此筆數時折線圖以 LTTB 降採樣到 LTTB_POINTS 個點 (圖寬約 1200px，更多點肉眼也看不出差別)
+LTTB_MIN_ROWS = 2000
+LTTB_POINTS = 1500
+
 # ---------------------------------------------------------
 # 2. 資料讀取區
 # ---------------------------------------------------------
+# 這是組員 A 的 Repo (公開連結)
+DATA_URL = "https://raw.githubusercontent.com/viviankoko/mnd_crawler/main/mnd_pla_wrangled.csv"
+# 同一份資料的 Parquet 版本 (由 GitHub Actions 產生)；若尚未發布則退回讀 CSV
+PARQUET_URL = "https://raw.githubusercontent.com/viviankoko/mnd_crawler/main/mnd_pla_wrangled.parquet"
+
+# 需要讀取的原始欄位 (ADIZ 欄位有兩種拼法)
+SOURCE_COLUMNS = ['日期', '共機架次', '共艦架次', '進入AIDZ共機架次', '進入ADIZ共機架次']
+
+@st.cache_resource
+def _session():
+    # 共用連線，避免每次重新建立 TCP/TLS
+    return requests.Session()
+
+@st.cache_resource
+def _etag_store():
+    # url -> (etag, last_modified, 原始內容)；放在 cache_resource 中才不會在每次 rerun 被清空
+    return {}
+
+def fetch_file(url):
+    """以條件式 GET 下載檔案，遠端未變動 (304) 時直接沿用上次的內容，回傳 (版本, 內容)"""
+    store = _etag_store()
+    etag, last_modified, content = store.get(url, (None, None, None))
+
+    headers = {}
+    if content is not None:
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    resp = _session().get(url, headers=headers, timeout=30)
+    if resp.status_code != 304:
+        resp.raise_for_status()
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        content = resp.content
+        store[url] = (etag, last_modified, content)
+
+    version = etag or last_modified or hashlib.sha1(content).hexdigest()
+    return version, content
+
+@st.cache_data(max_entries=4)
+def parse_csv(version, _content):
+    # 以版本 (ETag) 當快取鍵，內容沒變就不必重新解析
+    # 使用 PyArrow 的多執行緒 CSV 解析器；數值欄位有空值，所以不強制指定整數型別
+    df = pd.read_csv(BytesIO(_content), engine='pyarrow')
+    # 與 Parquet 一樣只保留需要的欄位，下載的 CSV 欄位才不會因資料來源而不同 (其餘上游欄位不會出現在下載檔中)
+    return df[[c for c in SOURCE_COLUMNS if c in df.columns]]
+
+@st.cache_data(max_entries=4)
+def parse_parquet(version, _content):
+    # 只讀需要的欄位；Parquet 本身帶型別，日期欄位直接是 datetime64
+    names = pq.ParquetFile(BytesIO(_content)).schema_arrow.names
+    columns = [c for c in SOURCE_COLUMNS if c in names]
+    return pd.read_parquet(BytesIO(_content), columns=columns, engine='pyarrow')
+
+def fetch_raw_data():
+    # 優先讀 Parquet，讀不到 (尚未發布、逾時、連線錯誤等) 時改讀 CSV；回傳 (資料版本, DataFrame)
+    # 只在 load_data 的快取過期時 (最多每小時一次) 才會被呼叫，Parquet 發布後下次重新載入就會改用
+    try:
+        version, content = fetch_file(PARQUET_URL)
+        return version, parse_parquet(version, content)
+    except requests.RequestException:
+        pass
+
+    version, content = fetch_file(DATA_URL)
+    return version, parse_csv(version, content)
+
 @st.cache_data(ttl=3600)
 def load_data():
-    # 這是組員 A 的 Repo (公開連結)
-    url = "https://raw.githubusercontent.com/viviankoko/mnd_crawler/main/mnd_pla_wrangled.csv"
-    
     try:
-        df = pd.read_csv(url)
+        version, df = fetch_raw_data()
         
         # 欄位對應
-        df = df.rename(columns={
+        cols = {
             '日期': 'date',
             '共機架次': 'total_aircraft',
             '共艦架次': 'ships',
-            '進入AIDZ共機架次': 'enter_adiz',
-            '進入ADIZ共機架次': 'enter_adiz'
-        })
+        }
+        # 原始資料的 ADIZ 欄位名稱曾拼錯成 AIDZ：兩種拼法並存時以正確拼法為主、缺值再用 AIDZ 欄補上，
+        # 只有一種時只對實際存在的那一個改名
+        adiz_cols = [c for c in ('進入ADIZ共機架次', '進入AIDZ共機架次') if c in df.columns]
+        if len(adiz_cols) == 2:
+            df['enter_adiz'] = df['進入ADIZ共機架次'].combine_first(df['進入AIDZ共機架次'])
+            df = df.drop(columns=adiz_cols)
+        elif adiz_cols:
+            cols[adiz_cols[0]] = 'enter_adiz'
+        df = df.rename(columns=cols)
         
         # 處理日期與空值
         df['date'] = pd.to_datetime(df['date'], errors='coerce')
         
-        # 過濾年份範圍：只保留 2000 ~ 2050 年
-        df = df[df['date'].notna()]
-        df = df[ (df['date'].dt.year >= 2000) & (df['date'].dt.year <= 2050) ]
+        # 過濾年份範圍：只保留 2000 ~ 2050 年 (NaT 與任何日期比較皆為 False，會一併被濾掉)
+        # 過濾與排序串在一起，只產生一份新的 DataFrame
+        vals = df['date'].to_numpy()
+        mask = (vals >= np.datetime64('2000-01-01')) & (vals < np.datetime64('2051-01-01'))
+        df = df.loc[mask].sort_values(by='date', ascending=False, ignore_index=True)
+        # 只對數值欄位補空值；架次都是小整數，補完後一併轉成 int16 以減少記憶體與圖表傳輸量
+        num_cols = ['total_aircraft', 'enter_adiz', 'ships']
+        df[num_cols] = df[num_cols].fillna(0).astype('int16')
+
+        # 日期字串只在快取建立時產生一次，不必每次 rerun 重算
+        df['date_str'] = np.datetime_as_string(df['date'].to_numpy(), unit='D')
 
-        df = df.sort_values(by='date', ascending=False)
-        df = df.fillna(0)
-        return df
+        # 另存一份 int64 的「距 1970-01-01 天數」陣列 (與 df 同樣由新到舊)，給日期篩選直接做二分搜尋
+        days = df['date'].to_numpy().astype('datetime64[D]').astype('int64')
+
+        # 資料版本 (ETag 或內容雜湊) 一併回傳，作為下游快取的鍵值
+        return df, days, version
 
     except Exception as e:
         st.error("⚠️ 資料讀取失敗！")
@@ -63,125 +156,90 @@ def load_data():
         st.error(f"錯誤訊息: {e}")
         st.stop()
 
-# 載入原始資料
-df = load_data()
-df['date_str'] = df['date'].dt.strftime('%Y-%m-%d')
+def date_to_days(d):
+    # datetime.date -> 距 1970-01-01 的天數
+    return np.datetime64(d, 'D').astype('int64')
 
-# ---------------------------------------------------------
-# ✨ [修改] 日期篩選器 (搬到主畫面，並放大顯示)
-# ---------------------------------------------------------
-st.divider() # 加一條分隔線
-st.subheader("🔎 選擇時間範圍")
-
-# 找出資料中最早和最晚的日期
-if not df.empty:
-    min_date = df['date'].min().date()
-    max_date = df['date'].max().date()
-else:
-    min_date = datetime.today().date()
-    max_date = datetime.today().date()
-
-# 建立兩欄佈局，讓選擇器不要佔滿整行
-col_filter_1, col_filter_2 = st.columns([1, 2])
-
-with col_filter_1:
-    # 日期選擇器
-    date_range = st.date_input(
-        "請選擇起始與結束日期",
-        value=(min_date, max_date), # 預設選取全部
-        min_value=min_date,
-        max_value=max_date
-    )
+def filter_bounds(days, start_date, end_date):
+    # days 由新到舊排序，反轉成遞增的 view 後用二分搜尋找出邊界，回傳 df 上的切片範圍 [lo, hi)
+    days_asc = days[::-1]
+    lo = np.searchsorted(days_asc, date_to_days(start_date), side='left')
+    hi = np.searchsorted(days_asc, date_to_days(end_date), side='right')
+    return len(days) - int(hi), len(days) - int(lo)
 
-# 處理日期選擇邏輯 (防呆：使用者可能只選了一個日期還沒選第二個)
-if len(date_range) == 2:
-    start_date, end_date = date_range
-    # 根據選擇過濾資料
-    mask = (df['date'].dt.date >= start_date) & (df['date'].dt.date <= end_date)
-    filtered_df = df.loc[mask]
-else:
-    # 如果使用者只點了一下還沒點第二下，先暫時顯示全部，避免報錯
-    start_date, end_date = min_date, max_date
-    filtered_df = df
+@st.cache_data(max_entries=32)
+def to_csv_bytes(version, lo, hi, _df):
+    # 下載用的 CSV 內容依「資料版本 + 切片範圍」快取，只在篩選結果改變時重新編碼
+    return _df.to_csv(index=False).encode('utf-8-sig')
 
-with col_filter_2:
-    # 顯示目前狀態
-    st.write("") # 為了排版對齊空一行
-    st.write(f"📊 目前顯示區間： **{start_date}** 到 **{end_date}**")
-    st.write(f"📈 資料筆數： **{len(filtered_df)}** 筆")
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets 降採樣，回傳保留下來的資料點索引"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
 
+    x = x.astype('float64')
+    y = y.astype('float64')
 
-# ---------------------------------------------------------
-# 3. 關鍵指標呈現 (顯示篩選範圍內最新的一天)
-# ---------------------------------------------------------
-st.divider()
-
-if not filtered_df.empty:
-    latest = filtered_df.iloc[0] 
-    
-    # 計算漲跌
-    if len(filtered_df) > 1:
-        prev = filtered_df.iloc[1]
-        delta_aircraft = int(latest['total_aircraft'] - prev['total_aircraft'])
-        delta_adiz = int(latest['enter_adiz'] - prev['enter_adiz'])
-        delta_ships = int(latest['ships'] - prev['ships'])
-    else:
-        delta_aircraft = 0
-        delta_adiz = 0
-        delta_ships = 0
-
-    st.subheader(f"📅 最新動態 ({latest['date_str']})")
+    # 第一點與最後一點固定保留，中間切成 n_out - 2 個桶子
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    idx = np.empty(n_out, dtype='int64')
+    idx[0] = 0
+    idx[-1] = n - 1
 
-    col1, col2, col3 = st.columns(3)
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
 
-    with col1:
-        st.metric(
-            label="偵獲共機總數 (架次)",
-            value=int(latest['total_aircraft']),
-            delta=delta_aircraft,
-            delta_color="inverse"
+        # 在目前的桶子裡挑出與上一個選中點、下一個桶子平均點所圍三角形面積最大的點
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
         )
+        a = start + int(np.argmax(area))
+        idx[i + 1] = a
 
-    with col2:
-        st.metric(
-            label="其中逾越中線/進入西南空域",
-            value=int(latest['enter_adiz']),
-            delta=delta_adiz,
-            delta_color="inverse"
-        )
+    return idx
 
-    with col3:
-        st.metric(
-            label="共艦 (艘次)",
-            value=int(latest['ships']),
-            delta=delta_ships,
-            delta_color="inverse"
-        )
+def build_fig(df):
+    # 回傳 go.Figure 物件 (由呼叫端存在 session_state 重複使用)；
+    # st.plotly_chart 收到 Figure 時不會重新驗證，收到 dict 反而會整份重建
+    fig = go.Figure()
 
-    # ---------------------------------------------------------
-    # 4. 趨勢圖表 (字體放大版)
-    # ---------------------------------------------------------
-    st.subheader("📊 數量變化趨勢")
+    # 資料點多時改用 WebGL 繪製，避免大量 SVG 元素拖慢瀏覽器
+    ScatterCls = go.Scattergl if len(df) > SCATTERGL_MIN_ROWS else go.Scatter
 
-    fig = go.Figure()
+    # 資料點太多時各折線分別以 LTTB 降採樣，保留趨勢形狀但減少傳給瀏覽器的點數
+    x = df['date'].to_numpy()
+    aircraft = df['total_aircraft'].to_numpy()
+    adiz = df['enter_adiz'].to_numpy()
+    if len(df) > LTTB_MIN_ROWS:
+        x_int = x.astype('int64')
+        idx_aircraft = lttb_indices(x_int, aircraft, LTTB_POINTS)
+        idx_adiz = lttb_indices(x_int, adiz, LTTB_POINTS)
+    else:
+        idx_aircraft = idx_adiz = slice(None)
 
     # 線圖：共機總數
-    fig.add_trace(go.Scatter(
-        x=filtered_df['date'], y=filtered_df['total_aircraft'],
+    fig.add_trace(ScatterCls(
+        x=x[idx_aircraft], y=aircraft[idx_aircraft],
         mode='lines+markers', name='共機總數',
         line=dict(color='#FF5733', width=3) # 線條加粗
     ))
 
     # 線圖：進入 ADIZ
-    fig.add_trace(go.Scatter(
-        x=filtered_df['date'], y=filtered_df['enter_adiz'],
+    fig.add_trace(ScatterCls(
+        x=x[idx_adiz], y=adiz[idx_adiz],
         mode='lines+markers', name='進入 ADIZ',
         line=dict(color='#C70039', width=3, dash='dot') # 線條加粗
     ))
 
     # 柱狀圖：共艦
     fig.add_trace(go.Bar(
-        x=filtered_df['date'], y=filtered_df['ships'],
+        x=df['date'], y=df['ships'],
         name='共艦艘次',
         marker_color='#33C4FF',
         opacity=0.4,
@@ -200,7 +258,7 @@ if not filtered_df.empty:
             showgrid=False
         ),
         hovermode="x unified",
-        
+
         # [這裡] 設定圖例 (Legend) 的字體大小和位置
         legend=dict(
             orientation="h",
@@ -209,39 +267,153 @@ if not filtered_df.empty:
             xanchor='center',
             font=dict(size=16) # 字體改大到 16px
         ),
-        
+
         # 設定座標軸字體大小
         xaxis=dict(tickfont=dict(size=14)),
         yaxis=dict(tickfont=dict(size=14))
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+# 載入原始資料
+df, days, version = load_data()
 
+# 篩選、指標、圖表與表格包成 fragment：調整日期或按下載時只重跑這一區，不必重跑整個頁面
+@st.fragment
+def filtered_view(df, days, version):
     # ---------------------------------------------------------
-    # 5. 詳細資料表格 & 下載功能
+    # ✨ [修改] 日期篩選器 (搬到主畫面，並放大顯示)
     # ---------------------------------------------------------
-    st.subheader("📝 詳細數據")
-    
-    # 製作下載 CSV
-    csv = filtered_df.to_csv(index=False).encode('utf-8-sig')
-
-    st.download_button(
-        label="📥 下載目前篩選的資料 (CSV)",
-        data=csv,
-        file_name='mnd_filtered_data.csv',
-        mime='text/csv',
-    )
-    
-    st.dataframe(
-        filtered_df[['date_str', 'total_aircraft', 'enter_adiz', 'ships']],
-        column_config={
-            "date_str": "日期",
-            "total_aircraft": st.column_config.NumberColumn("共機總數", format="%d"),
-            "enter_adiz": st.column_config.NumberColumn("進入 ADIZ", format="%d"),
-            "ships": st.column_config.NumberColumn("共艦", format="%d"),
-        },
-        use_container_width=True,
-        hide_index=True
-    )
-else:
-    st.warning("⚠️ 目前沒有資料可顯示，請檢查資料來源連結或調整篩選日期。")
\ No newline at end of file
+    st.divider() # 加一條分隔線
+    st.subheader("🔎 選擇時間範圍")
+
+    # 找出資料中最早和最晚的日期
+    if not df.empty:
+        min_date = df['date'].min().date()
+        max_date = df['date'].max().date()
+    else:
+        min_date = datetime.today().date()
+        max_date = datetime.today().date()
+
+    # 建立兩欄佈局，讓選擇器不要佔滿整行
+    col_filter_1, col_filter_2 = st.columns([1, 2])
+
+    with col_filter_1:
+        # 日期選擇器
+        date_range = st.date_input(
+            "請選擇起始與結束日期",
+            value=(min_date, max_date), # 預設選取全部
+            min_value=min_date,
+            max_value=max_date
+        )
+
+    # 處理日期選擇邏輯 (防呆：使用者可能只選了一個日期還沒選第二個)
+    if len(date_range) == 2:
+        start_date, end_date = date_range
+        # 根據選擇過濾資料：二分搜尋找出邊界後切片，切片本身不複製資料
+        lo, hi = filter_bounds(days, start_date, end_date)
+        filtered_df = df.iloc[lo:hi]
+    else:
+        # 如果使用者只點了一下還沒點第二下，先暫時顯示全部，避免報錯
+        start_date, end_date = min_date, max_date
+        lo, hi = 0, len(df)
+        filtered_df = df
+
+    with col_filter_2:
+        # 顯示目前狀態
+        st.write("") # 為了排版對齊空一行
+        st.write(f"📊 目前顯示區間： **{start_date}** 到 **{end_date}**")
+        st.write(f"📈 資料筆數： **{len(filtered_df)}** 筆")
+
+
+    # ---------------------------------------------------------
+    # 3. 關鍵指標呈現 (顯示篩選範圍內最新的一天)
+    # ---------------------------------------------------------
+    st.divider()
+
+    if not filtered_df.empty:
+        # 一次取出最新兩天的三個數值成為 ndarray (依序為共機、進入 ADIZ、共艦)
+        top = filtered_df[['total_aircraft', 'enter_adiz', 'ships']].head(2).to_numpy(dtype=np.int32)
+        cur = top[0]
+
+        # 計算漲跌 (只有一天資料時漲跌為 0)
+        prev = top[1] if len(top) > 1 else top[0]
+        deltas = cur - prev
+
+        st.subheader(f"📅 最新動態 ({filtered_df['date_str'].iat[0]})")
+
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.metric(
+                label="偵獲共機總數 (架次)",
+                value=int(cur[0]),
+                delta=int(deltas[0]),
+                delta_color="inverse"
+            )
+
+        with col2:
+            st.metric(
+                label="其中逾越中線/進入西南空域",
+                value=int(cur[1]),
+                delta=int(deltas[1]),
+                delta_color="inverse"
+            )
+
+        with col3:
+            st.metric(
+                label="共艦 (艘次)",
+                value=int(cur[2]),
+                delta=int(deltas[2]),
+                delta_color="inverse"
+            )
+
+        # ---------------------------------------------------------
+        # 4. 趨勢圖表 (字體放大版)
+        # ---------------------------------------------------------
+        st.subheader("📊 數量變化趨勢")
+
+        # 資料版本與篩選範圍都沒變 (例如只按了下載按鈕) 時直接沿用上次的 go.Figure
+        # 資料版本來自 ETag / 內容雜湊，遠端數字被修正時也會重新產生
+        fig_key = (version, lo, hi)
+        if st.session_state.get('trend_fig_key') != fig_key:
+            st.session_state.trend_fig = build_fig(filtered_df)
+            st.session_state.trend_fig_key = fig_key
+        st.plotly_chart(st.session_state.trend_fig, use_container_width=True)
+
+        # ---------------------------------------------------------
+        # 5. 詳細資料表格 & 下載功能
+        # ---------------------------------------------------------
+        st.subheader("📝 詳細數據")
+
+        # 製作下載 CSV
+        csv = to_csv_bytes(version, lo, hi, filtered_df)
+
+        st.download_button(
+            label="📥 下載目前篩選的資料 (CSV)",
+            data=csv,
+            file_name='mnd_filtered_data.csv',
+            mime='text/csv',
+        )
+
+        # 直接把需要的欄位轉成 Arrow Table 交給前端，省去先在 pandas 複製一份欄位子集
+        table = pa.Table.from_pandas(
+            filtered_df,
+            columns=['date_str', 'total_aircraft', 'enter_adiz', 'ships'],
+            preserve_index=False
+        )
+        st.dataframe(
+            table,
+            column_config={
+                "date_str": "日期",
+                "total_aircraft": st.column_config.NumberColumn("共機總數", format="%d"),
+                "enter_adiz": st.column_config.NumberColumn("進入 ADIZ", format="%d"),
+                "ships": st.column_config.NumberColumn("共艦", format="%d"),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.warning("⚠️ 目前沒有資料可顯示，請檢查資料來源連結或調整篩選日期。")
+
+filtered_view(df, days, version)